@@ -1,8 +1,10 @@
 
 
+import time
 import streamlit as st
 import pandas as pd
-from job_similarity_engine import search_by_natural_language
+import numpy as np
+from job_similarity_engine import search_jobs, encode_scores, decode_scores, decode_pair_table, take_directional_rows, load_manifest
 # ----------------------------------
 # PAGE CONFIG
 # ----------------------------------
@@ -14,30 +16,32 @@ st.set_page_config(
 # ----------------------------------
 # LOAD DATA (CACHED)
 # ----------------------------------
+# The manifest's pipeline hash changes whenever any exported artifact does,
+# so it doubles as the cache key for the loaded data
+pipeline_hash = load_manifest()["pipeline_hash"]
+
 @st.cache_data
-def load_data():
-    results = pd.read_excel("job_similarity_output_v1.xlsx")
-    matrix = pd.read_excel("job_similarity_matrix.xlsx", index_col=0)
+def load_data(pipeline_hash):
+    # Compact upper-triangular pair table (categorical IDs, fixed-point scores)
+    # kept in its stored encoding; only displayed pages are decoded
+    results = pd.read_pickle("job_similarity_pairs.pkl")
+
+    # Square matrix at storage precision, rows/columns in Job ID category order
+    matrix = np.load("job_similarity_matrix.npy")
     jobs_master = pd.read_csv("jobs_dataset.csv", encoding="latin1")
     
     
     
     # Clean column names
     results.columns = results.columns.str.strip()
-    matrix.columns = matrix.columns.str.strip()
     jobs_master.columns = jobs_master.columns.str.strip()
 
     # Clean Job IDs
-    results["Job ID"] = results["Job ID"].astype(str).str.replace(",", "").str.strip()
-    results["Compared Job ID"] = results["Compared Job ID"].astype(str).str.replace(",", "").str.strip()
-    matrix.index = matrix.index.astype(str).str.replace(",", "")
-    matrix.columns = matrix.columns.astype(str).str.replace(",", "")
-
     jobs_master["Job ID"] = jobs_master["Job ID"].astype(str).str.replace(",", "").str.strip()
 
     return results, matrix, jobs_master
 
-results_df, similarity_matrix, jobs_master = load_data()
+results_df, similarity_matrix, jobs_master = load_data(pipeline_hash)
 
 # ----------------------------------
 # STANDARDIZE COLUMN NAMES
@@ -100,6 +104,199 @@ job_id_to_name = (
     .to_dict()
 )
 
+def add_job_details(df):
+    """
+    Merge job metadata for both sides of a (single page of) similarity rows
+    """
+
+    # Merge main job
+    df = df.merge(
+        job_lookup,
+        on="Job ID",
+        how="left"
+    )
+
+    # Merge compared job
+    df = df.merge(
+        job_lookup.rename(columns={
+            "Job ID": "Compared Job ID",
+            "Job Name": "Compared Job Name",
+            "Work Stream": "Compared Work Stream",
+            "Domain": "Compared Domain"
+        }),
+        on="Compared Job ID",
+        how="left"
+    )
+
+    return df
+
+
+# ----------------------------------
+# SERVER-SIDE PAGINATION & SORTING
+# ----------------------------------
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Sortable pair columns → directional key arrays in the pair index
+PAIR_SORT_KEYS = {
+    "Similarity %": "similarity",
+    "Text Similarity %": "text",
+    "Competency Similarity %": "competency",
+    "Job ID": "job",
+    "Compared Job ID": "compared"
+}
+
+@st.cache_resource(max_entries=1)
+def build_pair_index(pipeline_hash, _pairs):
+    """
+    Sort orders over every directional pair row, built once per data version.
+    Item k < P is pair k (Job ID → Compared Job ID); item P + k is its reverse.
+    """
+    codes_a = _pairs["Job ID"].cat.codes.to_numpy().astype(np.int32)
+    codes_b = _pairs["Compared Job ID"].cat.codes.to_numpy().astype(np.int32)
+
+    similarity = _pairs["Similarity %"].to_numpy()
+    reverse_similarity = _pairs["Reverse Similarity %"].to_numpy()
+    text = _pairs["Text Similarity %"].to_numpy()
+    pair_max = np.maximum(similarity, reverse_similarity)
+
+    index = {
+        "n_pairs": len(_pairs),
+        "n_jobs": len(_pairs["Job ID"].cat.categories),
+        "similarity": np.concatenate([similarity, reverse_similarity]),
+        "text": np.concatenate([text, text]),
+        "competency": np.concatenate([
+            _pairs["Competency Similarity %"].to_numpy(),
+            _pairs["Reverse Competency Similarity %"].to_numpy()
+        ]),
+        "job": np.concatenate([codes_a, codes_b]),
+        "compared": np.concatenate([codes_b, codes_a]),
+        "pair_max": np.concatenate([pair_max, pair_max])
+    }
+
+    # Threshold view: every directional row, highest similarity first
+    index["by_similarity"] = np.argsort(-index["similarity"], kind="stable")
+    index["sorted_similarity"] = index["similarity"][index["by_similarity"]]
+
+    # Job views: rows grouped by Job ID (codes follow sorted Job IDs), strongest pair first
+    index["by_job"] = np.lexsort((-index["pair_max"], index["job"]))
+    index["job_offsets"] = np.searchsorted(
+        index["job"][index["by_job"]],
+        np.arange(index["n_jobs"] + 1)
+    )
+
+    return index
+
+pair_index = build_pair_index(pipeline_hash, results_df)
+
+# Thresholds are compared in the stored score encoding
+score_precision = str(results_df["Similarity %"].dtype)
+
+def stored_score(pct):
+    return encode_scores(pct, score_precision)
+
+def threshold_total(threshold):
+    """
+    Number of directional rows with similarity ≥ threshold (a prefix of the index)
+    """
+    return int(np.searchsorted(
+        -pair_index["sorted_similarity"], -stored_score(threshold), side="right"
+    ))
+
+def sort_items(items, sort_col, ascending):
+    """
+    Stable server-side sort of directional pair items by a pair column
+    """
+    keys = pair_index[PAIR_SORT_KEYS[sort_col]][items]
+    return items[np.argsort(keys if ascending else -keys, kind="stable")]
+
+def table_controls(total, key, sort_options, default_sort=0, default_ascending=False):
+    """
+    Sort and page controls for a result table; returns the sort choice and the
+    [start, stop) row range of the visible page
+    """
+    sort_ui, order_ui, size_ui, page_ui = st.columns(4)
+
+    sort_col = sort_ui.selectbox(
+        "Sort by", sort_options, index=default_sort, key=f"{key}_sort"
+    )
+    ascending = order_ui.radio(
+        "Order", ["Descending", "Ascending"], index=int(default_ascending),
+        horizontal=True, key=f"{key}_order"
+    ) == "Ascending"
+    page_size = size_ui.selectbox(
+        "Rows per page", PAGE_SIZES, index=1, key=f"{key}_size"
+    )
+
+    n_pages = max(1, -(-total // page_size))
+
+    # Keyed on the sort and row count so re-sorting or a new result set resets to page 1
+    page = page_ui.number_input(
+        f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1,
+        step=1, key=f"{key}_page_{sort_col}_{ascending}_{total}"
+    )
+
+    start = (page - 1) * page_size
+    stop = min(start + page_size, total)
+
+    st.caption(f"Showing rows {start + 1 if total else 0}–{stop} of {total}")
+
+    return sort_col, ascending, start, stop
+
+def render_pair_page(items, with_reverse=False):
+    """
+    Materialise, enrich and display only the directional pair items of one page;
+    with_reverse adds the Compared Job → Job similarity of each row
+    """
+    n_pairs = pair_index["n_pairs"]
+    page = decode_pair_table(
+        take_directional_rows(results_df, items % n_pairs, items >= n_pairs)
+    )
+
+    if with_reverse:
+        page.insert(
+            page.columns.get_loc("Similarity %") + 1,
+            "Reverse Similarity %",
+            decode_scores(pair_index["similarity"][(items + n_pairs) % (2 * n_pairs)])
+        )
+
+    st.dataframe(
+        format_similarity_display(add_job_details(page)),
+        width="stretch",
+        hide_index=True
+    )
+
+def job_match_items(job_codes, match_count):
+    """
+    The match_count matched items of each job (its strongest pairs), ordered by Compared Job ID
+    """
+    offsets = pair_index["job_offsets"][job_codes]
+    items = pair_index["by_job"][offsets[:, None] + np.arange(match_count)]
+    order = np.argsort(pair_index["compared"][items], axis=1, kind="stable")
+    return np.take_along_axis(items, order, axis=1).ravel()
+
+@st.cache_resource(max_entries=8)
+def threshold_order(pipeline_hash, threshold, sort_col, ascending):
+    """
+    Directional items with similarity ≥ threshold in a non-default sort order
+    """
+    return sort_items(pair_index["by_similarity"][:threshold_total(threshold)], sort_col, ascending)
+
+@st.cache_resource(max_entries=8)
+def match_counts(pipeline_hash, threshold):
+    """
+    Per job (by code), the number of unordered pairs matching in either direction
+    """
+    matched = pair_index["pair_max"] >= stored_score(threshold)
+    return np.bincount(pair_index["job"][matched], minlength=pair_index["n_jobs"])
+
+@st.cache_resource(max_entries=8)
+def drilldown_order(pipeline_hash, threshold, match_count, sort_col, ascending):
+    """
+    Matched items of every job with match_count matches, in a non-default sort order
+    """
+    drill_codes = np.flatnonzero(match_counts(pipeline_hash, threshold) == match_count)
+    return sort_items(job_match_items(drill_codes, match_count), sort_col, ascending)
+
 
 
 
@@ -123,6 +320,7 @@ st.markdown("---")
 # SIDEBAR CONTROLS
 # ----------------------------------
 st.sidebar.header("🔎 Explore Similar Roles")
+st.sidebar.caption(f"Data version: {pipeline_hash}")
 
 search_mode = st.sidebar.radio(
     "Search Mode",
@@ -138,7 +336,7 @@ search_mode = st.sidebar.radio(
 # ----------------------------------
 if search_mode == "Search by Job ID":
 
-    job_ids = sorted(results_df["Job ID"].unique())
+    job_ids = sorted(results_df["Job ID"].cat.categories)
 
     job_display_options = {
         job_id: f"{job_id} – {job_id_to_name.get(job_id, '')}"
@@ -159,64 +357,21 @@ if search_mode == "Search by Job ID":
         value=50
     )
 
-    filtered = (
-        results_df[
-            (results_df["Job ID"] == selected_job) &
-            (results_df["Similarity %"] >= min_sim)
-        ]
-        .sort_values("Similarity %", ascending=False)
-        .reset_index(drop=True)
-    )
+    # Selected job's directional rows are one contiguous slice of the pair index
+    job_code = results_df["Job ID"].cat.categories.get_loc(selected_job)
+    items = pair_index["by_job"][
+        pair_index["job_offsets"][job_code]:pair_index["job_offsets"][job_code + 1]
+    ]
+    items = items[pair_index["similarity"][items] >= stored_score(min_sim)]
 
     st.subheader(f"📌 Similar roles for Job ID: {selected_job}")
-    st.caption(f"🔢 {len(filtered)} matching roles found")
+    st.caption(f"🔢 {len(items)} matching roles found")
 
-    
-    filtered_display = filtered.copy()
-    
-    # Merge main job
-    filtered_display = filtered_display.merge(
-        job_lookup,
-        on="Job ID",
-        how="left"
-    )
-    
-    # Merge compared job
-    filtered_display = filtered_display.merge(
-        job_lookup.rename(columns={
-            "Job ID": "Compared Job ID",
-            "Job Name": "Compared Job Name",
-            "Work Stream": "Compared Work Stream",
-            "Domain": "Compared Domain"
-        }),
-        on="Compared Job ID",
-        how="left"
+    sort_col, ascending, start, stop = table_controls(
+        len(items), "job", list(PAIR_SORT_KEYS)
     )
 
-
-    
-    # Reorder columns (clean UI)
-    priority_cols = [
-    "Job ID",
-    "Job Name",
-    "Work Stream",
-    "Domain",
-    "Compared Job ID",
-    "Compared Job Name",
-    "Compared Work Stream",
-    "Compared Domain",
-    "Similarity %",
-    "Text Similarity %",
-    "Competency Similarity %",
-    "Similarity Reason"
-    ]
-
-
-    
-    filtered_display = format_similarity_display(filtered_display)
-
-    
-    st.dataframe(filtered_display, width="stretch", hide_index=True)
+    render_pair_page(sort_items(items, sort_col, ascending)[start:stop])
 
 
 
@@ -233,36 +388,20 @@ elif search_mode == "Filter by Similarity Threshold":
         value=70
     )
 
-    filtered = (
-        results_df[
-            results_df["Similarity %"] >= threshold
-        ]
-        .sort_values("Similarity %", ascending=False)
-        .reset_index(drop=True)
-    )
-
-    # VERY IMPORTANT: build display dataset from THIS cleaned filtered
-    filtered_clean = filtered.copy()
+    # Directional rows ≥ threshold are a prefix of the similarity-sorted index
+    total_pairs = threshold_total(threshold)
 
     # ----------------------------------
     # Compute UNIQUE job match counts
     # ----------------------------------
     
-    # Build mapping of Job ID → set of matched Job IDs
-    job_match_map = {}
-    
-    for _, row in filtered.iterrows():
-        job_a = str(row["Job ID"])
-        job_b = str(row["Compared Job ID"])
-    
-        if job_a != job_b:  # safety check
-            job_match_map.setdefault(job_a, set()).add(job_b)
-            job_match_map.setdefault(job_b, set()).add(job_a)
-    
-    # Convert to counts
+    # Unordered pairs matching in either direction; each pair counts once per job
+    counts_by_code = match_counts(pipeline_hash, threshold)
+
     job_counts = {
-        job_id: len(matches)
-        for job_id, matches in job_match_map.items()
+        job_id: int(count)
+        for job_id, count in zip(results_df["Job ID"].cat.categories, counts_by_code)
+        if count > 0
     }
     
     unique_jobs = len(job_counts)
@@ -273,7 +412,7 @@ elif search_mode == "Filter by Similarity Threshold":
     st.sidebar.markdown("## 📊 Similarity Summary")
 
     st.sidebar.markdown(f"""
-    **Total Matching Pairs:** {len(filtered)}  
+    **Total Matching Pairs:** {total_pairs}  
     **Unique Job IDs:** {unique_jobs}
     """)
 
@@ -314,55 +453,19 @@ elif search_mode == "Filter by Similarity Threshold":
 
     # Main page table
     st.subheader(f"📈 Job pairs with similarity ≥ {threshold}%")
-    st.caption(f"🔢 {len(filtered)} job pairs found")
-    filtered_display = filtered_clean.copy()
-
+    st.caption(f"🔢 {total_pairs} job pairs found")
 
-
-    # Merge main job
-    filtered_display = filtered_display.merge(
-        job_lookup,
-        on="Job ID",
-        how="left"
-    )
-    
-    # Merge compared job
-    filtered_display = filtered_display.merge(
-        job_lookup.rename(columns={
-            "Job ID": "Compared Job ID",
-            "Job Name": "Compared Job Name",
-            "Work Stream": "Compared Work Stream",
-            "Domain": "Compared Domain"
-        }),
-        on="Compared Job ID",
-        how="left"
+    sort_col, ascending, start, stop = table_controls(
+        total_pairs, "threshold", list(PAIR_SORT_KEYS)
     )
 
+    if sort_col == "Similarity %" and not ascending:
+        # Default order: slice the precomputed index directly
+        page_items = pair_index["by_similarity"][start:stop]
+    else:
+        page_items = threshold_order(pipeline_hash, threshold, sort_col, ascending)[start:stop]
 
-    
-    priority_cols = [
-    "Job ID",
-    "Job Name",
-    "Work Stream",
-    "Domain",
-    "Compared Job ID",
-    "Compared Job Name",
-    "Compared Work Stream",
-    "Compared Domain",
-    "Similarity %",
-    "Text Similarity %",
-    "Competency Similarity %",
-    "Similarity Reason"
-    ]
-
-    
-    filtered_display = format_similarity_display(filtered_display)
-    
-    st.dataframe(
-    filtered_display,
-    width="stretch",
-    hide_index=True
-    )
+    render_pair_page(page_items)
 
     # ----------------------------------
     # DRILLDOWN SECTION (FULL WIDTH BELOW)
@@ -373,58 +476,34 @@ elif search_mode == "Filter by Similarity Threshold":
         st.markdown("---")
         st.subheader("📌 Drilldown View")
 
-        # Step 1: Get Job IDs with selected match count
-        job_ids_with_count = sorted([
-            job_id for job_id, count in job_counts.items()
-            if count == selected_match_count
-        ])
+        # Step 1: Get Job IDs (as sorted codes) with selected match count;
+        # each has exactly selected_match_count matched rows
+        drill_codes = np.flatnonzero(counts_by_code == selected_match_count)
+        total_rows = len(drill_codes) * selected_match_count
 
-        drill_rows = []
+        st.caption(f"🔢 {len(drill_codes)} Job IDs found")
 
-        for job_id in job_ids_with_count:
-
-            # Rows where job_id is primary
-            direct_rows = filtered_clean[
-                filtered_clean["Job ID"] == job_id
-            ].copy()
-
-            # Rows where job_id is secondary → flip
-            reverse_rows = filtered_clean[
-                filtered_clean["Compared Job ID"] == job_id
-            ].copy()
-
-            if not reverse_rows.empty:
-                reverse_rows = reverse_rows.rename(columns={
-                    "Job ID": "Compared Job ID",
-                    "Compared Job ID": "Job ID"
-                })
+        sort_col, ascending, start, stop = table_controls(
+            total_rows, "drilldown", list(PAIR_SORT_KEYS),
+            default_sort=list(PAIR_SORT_KEYS).index("Job ID"), default_ascending=True
+        )
 
-            combined = pd.concat([direct_rows, reverse_rows], ignore_index=True)
-            drill_rows.append(combined)
+        if sort_col == "Job ID" and ascending:
+            # Default order (Job ID, Compared Job ID): only the jobs on this page
+            first_job = start // selected_match_count
+            last_job = -(-stop // selected_match_count)
+            offset = first_job * selected_match_count
 
-        if drill_rows:
-            drilldown_df = pd.concat(drill_rows, ignore_index=True)
+            page_items = job_match_items(
+                drill_codes[first_job:last_job], selected_match_count
+            )[start - offset:stop - offset]
         else:
-            drilldown_df = pd.DataFrame()
-
-        drilldown_df = drilldown_df[
-            drilldown_df["Job ID"].isin(job_ids_with_count)
-        ]
+            page_items = drilldown_order(
+                pipeline_hash, threshold, selected_match_count, sort_col, ascending
+            )[start:stop]
 
-        drilldown_df = drilldown_df.sort_values(
-            by=["Job ID", "Compared Job ID"]
-        ).reset_index(drop=True)
-
-        st.caption(f"🔢 {len(job_ids_with_count)} Job IDs found")
-
-        
-        st.dataframe(
-            drilldown_df,
-            width="stretch",
-            hide_index=True
-        )
-
-        csv = drilldown_df.to_csv(index=False).encode("utf-8")
+        # A pair matches if either direction passes; show both so no row hides its match
+        render_pair_page(page_items, with_reverse=True)
 
 
     
@@ -438,6 +517,25 @@ elif search_mode == "NLP Search":
 
     st.subheader("🧠 Natural Language Job Search")
 
+    retrieval_modes = {
+        "Semantic (Embeddings)": "semantic",
+        "Lexical (BM25)": "lexical",
+        "Hybrid (BM25 + Embeddings)": "hybrid"
+    }
+
+    retrieval_mode = st.sidebar.radio(
+        "Retrieval Mode",
+        list(retrieval_modes.keys())
+    )
+
+    max_results = st.sidebar.number_input(
+        "Maximum Results",
+        min_value=10,
+        max_value=max(10, len(job_lookup)),
+        value=min(20, max(10, len(job_lookup))),
+        step=10
+    )
+
     query = st.text_input(
         "Describe the role you are looking for",
         placeholder="e.g. Find jobs similar to a data architect role"
@@ -445,30 +543,44 @@ elif search_mode == "NLP Search":
 
     if query:
 
-        results = search_by_natural_language(query)
+        search_start = time.perf_counter()
+        results = search_jobs(query, top_k=int(max_results), mode=retrieval_modes[retrieval_mode])
+        search_ms = (time.perf_counter() - search_start) * 1000
 
         if results is not None and not results.empty:
 
+            # Results arrive ranked by the selected mode's score
             results_display = results.copy()
 
-            # Sort descending by similarity
-            if "Similarity %" in results_display.columns:
-                results_display = results_display.sort_values(
-                    by="Similarity %",
-                    ascending=False
-                ).reset_index(drop=True)
-
             # Show total count
-            st.caption(f"🔢 {len(results_display)} matching roles found")
-
-            # Merge job metadata
-            if "Job ID" in results_display.columns:
-                results_display = results_display.merge(
-                    job_lookup,
-                    on="Job ID",
-                    how="left"
+            st.caption(
+                f"🔢 {len(results_display)} matching roles found "
+                f"• ⏱️ {search_ms:.1f} ms ({retrieval_mode})"
+            )
+
+            score_cols = [
+                c for c in results_display.columns
+                if c != "Job ID"
+            ]
+
+            sort_col, ascending, start, stop = table_controls(
+                len(results_display), f"nlp_{retrieval_modes[retrieval_mode]}", score_cols + ["Job ID"]
+            )
+
+            if sort_col != score_cols[0] or ascending:
+                results_display = results_display.sort_values(
+                    by=sort_col, ascending=ascending, kind="stable"
                 )
 
+            results_display = results_display.iloc[start:stop]
+
+            # Merge job metadata (visible page only)
+            results_display = results_display.merge(
+                job_lookup,
+                on="Job ID",
+                how="left"
+            )
+
             # Reorder columns (Source format style)
             ordered_cols = [
                 "Domain",
@@ -499,38 +611,52 @@ elif search_mode == "NLP Search":
 # ----------------------------------
 with st.expander("🧮 Job-Specific Similarity Matrix View"):
 
+    matrix_job_ids = results_df["Job ID"].cat.categories
+
     matrix_job = st.selectbox(
     "Select Job",
-    similarity_matrix.index.tolist(),
+    matrix_job_ids.tolist(),
     format_func=lambda x: f"{x} – {job_id_to_name.get(x, '')}"
     )
 
 
-    matrix_view = (
-        similarity_matrix
-        .loc[[matrix_job]]
-        .T
-        .sort_values(by=matrix_job, ascending=False)
-        .rename(columns={matrix_job: "Similarity %"})
-    )
+    matrix_row = similarity_matrix[matrix_job_ids.get_loc(matrix_job)]
 
     st.caption(f"Showing similarity scores for Job ID: {matrix_job}")
-    st.dataframe(matrix_view, use_container_width=True)
 
-#st.markdown("### 📥 Download Outputs")
+    sort_col, ascending, start, stop = table_controls(
+        len(matrix_row), "matrix", ["Similarity %", "Job ID"]
+    )
 
-import io
+    if sort_col == "Similarity %":
+        order = np.argsort(matrix_row if ascending else -matrix_row, kind="stable")
+    else:
+        # Columns already follow sorted Job IDs
+        order = np.arange(len(matrix_row))
+        if not ascending:
+            order = order[::-1]
+
+    page = order[start:stop]
+
+    # Decode only the visible page
+    matrix_view = pd.DataFrame(
+        {"Similarity %": decode_scores(matrix_row[page])},
+        index=matrix_job_ids[page]
+    )
+
+    st.dataframe(matrix_view, width="stretch")
 
 #st.markdown("### 📥 Download Outputs")
 
-# Create in-memory Excel file
-excel_buffer = io.BytesIO()
-similarity_matrix.to_excel(excel_buffer, engine="openpyxl")
-excel_buffer.seek(0)
+# Serve the exported workbook as-is instead of re-serialising the matrix each rerun
+@st.cache_data
+def load_matrix_workbook(pipeline_hash):
+    with open("job_similarity_matrix.xlsx", "rb") as f:
+        return f.read()
 
 st.download_button(
     label="⬇️ Download Full Job Similarity Matrix (Excel)",
-    data=excel_buffer,
+    data=load_matrix_workbook(pipeline_hash),
     file_name="job_similarity_matrix.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
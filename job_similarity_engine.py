@@ -7,18 +7,109 @@ Created on Tue Feb 10 14:42:42 2026
 #Import libraries
 import pandas as pd
 import numpy as np
+import os
+import re
+import json
+import time
+import pickle
+import hashlib
+import unicodedata
 import warnings
+from collections import Counter
 warnings.filterwarnings("ignore")
 from sentence_transformers import SentenceTransformer
 #from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics.pairwise import cosine_similarity
 
 
-# Load Dataset
-df = pd.read_csv("jobs_dataset.csv", encoding="latin1")
-
-df["Job ID"] = df["Job ID"].astype(str)
-df = df.reset_index(drop=True)
+#Pipeline Manifest (Stage Cache)
+# Stages: ingest → competencies → embeddings → competency_vocabulary →
+# search_index / text_similarity → competency_similarity → fusion →
+# explanations → export. Each stage is keyed by a hash of its upstream stage
+# hashes and its parameters; unchanged stages load their cached artifact.
+DATASET_PATH = "jobs_dataset.csv"
+MODEL_NAME = "all-MiniLM-L6-v2"
+PIPELINE_CACHE_DIR = ".pipeline_cache"
+MANIFEST_PATH = "pipeline_manifest.json"
+
+# Bump when stage code changes in a way that invalidates cached artifacts
+PIPELINE_VERSION = 2
+
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def load_manifest(path=MANIFEST_PATH):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"pipeline_hash": None, "stages": {}}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+manifest = load_manifest()
+stage_hashes = {}
+
+def run_stage(name, inputs, params, compute, outputs=()):
+    """
+    Run a pipeline stage, or load its cached artifact when its input hashes,
+    parameters and output files are unchanged since the recorded run
+    """
+    upstream = {stage: stage_hashes[stage] for stage in inputs}
+    stage_hash = fingerprint(name, PIPELINE_VERSION, upstream, params)
+    artifact = os.path.join(PIPELINE_CACHE_DIR, f"{name}-{stage_hash}.pkl")
+
+    recorded = manifest["stages"].get(name, {})
+    if (
+        recorded.get("hash") == stage_hash
+        and os.path.exists(artifact)
+        and all(os.path.exists(path) for path in outputs)
+    ):
+        with open(artifact, "rb") as f:
+            result = pickle.load(f)
+        print(f"♻️ Stage '{name}' unchanged ({stage_hash}), loaded cached artifact")
+    else:
+        start = time.perf_counter()
+        result = compute()
+
+        os.makedirs(PIPELINE_CACHE_DIR, exist_ok=True)
+        with open(artifact, "wb") as f:
+            pickle.dump(result, f)
+
+        if recorded.get("artifact") and recorded["artifact"] != artifact and os.path.exists(recorded["artifact"]):
+            os.remove(recorded["artifact"])
+
+        print(f"✅ Stage '{name}' computed in {time.perf_counter() - start:.2f}s ({stage_hash})")
+
+    stage_hashes[name] = stage_hash
+    manifest["stages"][name] = {
+        "hash": stage_hash,
+        "inputs": upstream,
+        "params": json.loads(json.dumps(params, default=str)),
+        "artifact": artifact,
+        "outputs": list(outputs)
+    }
+    return result
+
+
+#Precision Configuration
+# Matrices are computed in float32; scores are stored as "float32", "float16"
+# or "int16" (signed fixed-point hundredths of a percent, so negative cosine
+# scores keep their value and order)
+COMPUTE_DTYPE = np.float32
+SCORE_PRECISIONS = ["float32", "float16", "int16"]
+SCORE_PRECISION = "int16"
 
 #Text Feature Engineering (Role Understanding)
 TEXT_COLS = [
@@ -28,61 +119,219 @@ TEXT_COLS = [
     "Outcomes & KPIs"
 ]
 
-for col in TEXT_COLS:
-    if col not in df.columns:
-        df[col] = ""
+# Load Dataset
+def ingest():
+    df = pd.read_csv(DATASET_PATH, encoding="latin1")
+
+    df["Job ID"] = df["Job ID"].astype(str)
+    df = df.reset_index(drop=True)
 
-df["combined_text"] = (
-    df[TEXT_COLS]
-    .fillna("")
-    .astype(str)
-    .agg(" ".join, axis=1)
+    for col in TEXT_COLS:
+        if col not in df.columns:
+            df[col] = ""
+
+    df["combined_text"] = (
+        df[TEXT_COLS]
+        .fillna("")
+        .astype(str)
+        .agg(" ".join, axis=1)
+    )
+
+    return df
+
+df = run_stage(
+    "ingest",
+    inputs=[],
+    params={"dataset": file_fingerprint(DATASET_PATH), "text_cols": TEXT_COLS},
+    compute=ingest
 )
 
+# Job ID lookup table; pair tables hold integer codes into it
+job_id_table, job_codes = np.unique(df["Job ID"].values, return_inverse=True)
+job_codes = job_codes.astype(np.int32)
+
 #Competency Extraction
 COMP_COLS = [f"Competency {i}" for i in range(1, 13)]
 
-for col in COMP_COLS:
-    if col not in df.columns:
-        df[col] = np.nan
-
 def extract_competencies(row):
     return [
         str(row[c]).strip()
         for c in COMP_COLS
-        if pd.notna(row[c]) and str(row[c]).strip() != ""
+        if c in row.index and pd.notna(row[c]) and str(row[c]).strip() != ""
     ]
 
-df["competency_list"] = df.apply(extract_competencies, axis=1)
+#Competency Canonicalisation
+
+# Opt-in alias merging: canonical competencies within this cosine similarity of a
+# more frequent competency are merged into it (None disables)
+COMP_ALIAS_THRESHOLD = None
+
+def canonicalize_competency(name):
+    """
+    Case-fold and normalise punctuation/whitespace so spelling variants share one key
+    """
+    name = unicodedata.normalize("NFKC", str(name)).casefold()
+    name = name.replace("&", " and ")
+    name = re.sub(r"[^\w\s+#]", " ", name)
+    return re.sub(r"\s+", " ", name).strip()
+
+def competency_extraction():
+    raw_lists = df.apply(extract_competencies, axis=1).tolist()
+
+    raw_counts = Counter(c for comps in raw_lists for c in comps)
+
+    # Most frequent raw spelling becomes the display name of each canonical key
+    key_counts = Counter()
+    key_display = {}
+    for raw, count in sorted(raw_counts.items(), key=lambda x: (-x[1], x[0])):
+        key = canonicalize_competency(raw)
+        key_counts[key] += count
+        key_display.setdefault(key, raw)
+
+    return {
+        "raw_lists": raw_lists,
+        "raw_vocabulary_size": len(raw_counts),
+        "key_counts": key_counts,
+        "key_display": key_display,
+        "canonical_keys": sorted(key_display)
+    }
+
+competencies = run_stage(
+    "competencies",
+    inputs=["ingest"],
+    params={"comp_cols": COMP_COLS},
+    compute=competency_extraction
+)
+
+canonical_keys = competencies["canonical_keys"]
+key_counts = competencies["key_counts"]
+key_display = competencies["key_display"]
 
 #NLP Embeddings (Deep Learning)
+_embedding_model = None
+
+def load_embedding_model():
+    """
+    Sentence-BERT model, loaded on first use so cached reruns skip it
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = SentenceTransformer(MODEL_NAME)
+    return _embedding_model
+
+def embed():
+    model = load_embedding_model()
+
+    # Text embeddings
+    text_embeddings = np.asarray(
+        model.encode(
+            df["combined_text"].tolist(),
+            normalize_embeddings=True
+        ),
+        dtype=COMPUTE_DTYPE
+    )
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    # Canonical competency embeddings
+    key_embeddings = np.asarray(
+        model.encode(
+            [key_display[k] for k in canonical_keys],
+            normalize_embeddings=True
+        ),
+        dtype=np.float32
+    )
 
-# Text embeddings
-text_embeddings = model.encode(
-    df["combined_text"].tolist(),
-    normalize_embeddings=True
-)
+    return text_embeddings, key_embeddings
 
-# Unique competencies embedding
-all_competencies = sorted(
-    set(c for comps in df["competency_list"] for c in comps)
+text_embeddings, key_embeddings = run_stage(
+    "embeddings",
+    inputs=["ingest", "competencies"],
+    params={"model": MODEL_NAME, "dtype": COMPUTE_DTYPE},
+    compute=embed
 )
 
-comp_embeddings = model.encode(
-    all_competencies,
-    normalize_embeddings=True
+def build_competency_vocabulary():
+    key_to_comp_id = np.arange(len(canonical_keys))
+    representatives = {i: i for i in range(len(canonical_keys))}
+
+    # Optional alias merging: most frequent competencies become representatives and
+    # each other competency joins its nearest representative within the threshold,
+    # so every member of a group is close to the vector it is scored with
+    if COMP_ALIAS_THRESHOLD is not None and len(canonical_keys) > 0:
+        by_frequency = sorted(
+            range(len(canonical_keys)),
+            key=lambda i: (-key_counts[canonical_keys[i]], canonical_keys[i])
+        )
+
+        rep_keys = []
+        for key_idx in by_frequency:
+            if rep_keys:
+                sims = key_embeddings[rep_keys] @ key_embeddings[key_idx]
+                nearest = int(np.argmax(sims))
+                if sims[nearest] >= COMP_ALIAS_THRESHOLD:
+                    key_to_comp_id[key_idx] = nearest
+                    continue
+            key_to_comp_id[key_idx] = len(rep_keys)
+            rep_keys.append(key_idx)
+
+        representatives = dict(enumerate(rep_keys))
+
+    n_comp_ids = len(representatives)
+
+    all_competencies = [key_display[canonical_keys[representatives[i]]] for i in range(n_comp_ids)]
+
+    # Contiguous float32 competency vector table indexed by competency ID
+    comp_vectors = np.ascontiguousarray(
+        key_embeddings[[representatives[i] for i in range(n_comp_ids)]],
+        dtype=np.float32
+    )
+
+    key2id = {key: int(comp_id) for key, comp_id in zip(canonical_keys, key_to_comp_id)}
+
+    def competency_ids(comps):
+        ids = []
+        for c in comps:
+            comp_id = key2id[canonicalize_competency(c)]
+            if comp_id not in ids:
+                ids.append(comp_id)
+        return ids
+
+    id_lists = [competency_ids(comps) for comps in competencies["raw_lists"]]
+
+    # Integer competency ID per job slot (-1 = empty slot)
+    comp_slots = np.full((len(df), len(COMP_COLS)), -1, dtype=np.int32)
+    for row, ids in enumerate(id_lists):
+        comp_slots[row, :len(ids)] = ids
+
+    print(
+        f"✅ Competency vocabulary: {competencies['raw_vocabulary_size']} raw → "
+        f"{len(canonical_keys)} canonical → {n_comp_ids} after alias merging"
+    )
+
+    return {
+        "all_competencies": all_competencies,
+        "comp_vectors": comp_vectors,
+        "id_lists": id_lists,
+        "comp_slots": comp_slots
+    }
+
+vocabulary = run_stage(
+    "competency_vocabulary",
+    inputs=["competencies", "embeddings"],
+    params={"alias_threshold": COMP_ALIAS_THRESHOLD},
+    compute=build_competency_vocabulary
 )
 
-comp2vec = dict(zip(all_competencies, comp_embeddings))
+all_competencies = vocabulary["all_competencies"]
+comp_vectors = vocabulary["comp_vectors"]
+comp_slots = vocabulary["comp_slots"]
 
+df["competency_ids"] = vocabulary["id_lists"]
+df["competency_list"] = df["competency_ids"].apply(
+    lambda ids: [all_competencies[i] for i in ids]
+)
 
-#####NLP Search Addition####
-def load_embedding_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
 
-model = load_embedding_model()
+#####NLP Search Addition####
 
 def search_by_natural_language(query, top_k=20):
     """
@@ -90,7 +339,7 @@ def search_by_natural_language(query, top_k=20):
     """
 
     # Encode user query
-    query_embedding = model.encode(
+    query_embedding = load_embedding_model().encode(
         [query],
         normalize_embeddings=True
     )
@@ -98,7 +347,7 @@ def search_by_natural_language(query, top_k=20):
     # Compute cosine similarity with all jobs
     scores = cosine_similarity(
         query_embedding,
-        text_embeddings
+        search_embeddings
     )[0]
 
     # Build result dataframe
@@ -118,68 +367,330 @@ def search_by_natural_language(query, top_k=20):
     return results
 
 
+#Lexical Search Index (BM25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Hybrid fusion: reciprocal rank fusion over the top candidates of each index
+HYBRID_CANDIDATES = 50
+HYBRID_RRF_K = 60
+
+SEARCH_MODES = ["semantic", "lexical", "hybrid"]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def build_bm25_index(documents):
+    """
+    Inverted index of term -> (job indices, precomputed BM25 weights)
+    """
+    n_docs = len(documents)
+    doc_lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+    avg_length = max(float(doc_lengths.mean()), 1.0) if n_docs else 1.0
+
+    postings = {}
+    for doc_id, tokens in enumerate(documents):
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term, []).append((doc_id, tf))
+
+    index = {}
+    for term, entries in postings.items():
+        ids = np.array([doc_id for doc_id, _ in entries], dtype=np.int32)
+        tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+
+        idf = np.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+        norm = tfs + BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[ids] / avg_length)
+
+        index[term] = (ids, (idf * tfs * (BM25_K1 + 1) / norm).astype(np.float32))
+
+    return {"n_docs": n_docs, "postings": index}
+
+def bm25_scores(query):
+    """
+    Score every job against the query by walking only the query terms' postings
+    """
+    scores = np.zeros(bm25_index["n_docs"], dtype=np.float32)
+
+    for term in set(tokenize(query)):
+        if term in bm25_index["postings"]:
+            ids, weights = bm25_index["postings"][term]
+            scores[ids] += weights
+
+    return scores
+
+TEXT_EMBEDDINGS_PATH = "job_text_embeddings.npy"
+BM25_INDEX_PATH = "job_bm25_index.pkl"
+
+def build_search_index():
+    # Index responsibilities text plus competency names so exact skill/tool terms match
+    bm25_index = build_bm25_index([
+        tokenize(text) + tokenize(" ".join(comps))
+        for text, comps in zip(df["combined_text"], df["competency_list"])
+    ])
+
+    # Persist both search indexes side by side; the files are the stage's artifact
+    np.save(TEXT_EMBEDDINGS_PATH, text_embeddings)
+
+    with open(BM25_INDEX_PATH, "wb") as f:
+        pickle.dump(bm25_index, f)
+
+    return [TEXT_EMBEDDINGS_PATH, BM25_INDEX_PATH]
+
+def load_search_index():
+    """
+    Load the persisted embedding and BM25 indexes used by the search functions
+    """
+    with open(BM25_INDEX_PATH, "rb") as f:
+        bm25_index = pickle.load(f)
+    return np.load(TEXT_EMBEDDINGS_PATH), bm25_index
+
+run_stage(
+    "search_index",
+    inputs=["ingest", "embeddings", "competency_vocabulary"],
+    params={"k1": BM25_K1, "b": BM25_B, "token_pattern": TOKEN_PATTERN.pattern},
+    compute=build_search_index,
+    outputs=[TEXT_EMBEDDINGS_PATH, BM25_INDEX_PATH]
+)
+
+search_embeddings, bm25_index = load_search_index()
+
+
+def search_by_keywords(query, top_k=20):
+    """
+    Lexical search using the BM25 inverted index
+    """
+    scores = bm25_scores(query)
+
+    # Candidates are only jobs containing at least one query term
+    candidates = np.flatnonzero(scores)
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+
+    return pd.DataFrame({
+        "Job ID": df["Job ID"].values[candidates],
+        "BM25 Score": np.round(scores[candidates], 3)
+    })
+
+
+def search_hybrid(query, top_k=20):
+    """
+    Hybrid search: fuse BM25 and embedding rankings with reciprocal rank fusion
+    """
+    lexical = bm25_scores(query)
+
+    # The semantic side deliberately stays a full dense scan: at this dataset size
+    # (one embedding per job) it is exact and cheaper than an ANN index, and it keeps
+    # paraphrase matches that share no term with the query. Only the lexical side
+    # is narrowed by the inverted index.
+
+    query_embedding = load_embedding_model().encode(
+        [query],
+        normalize_embeddings=True
+    )
+    semantic = cosine_similarity(query_embedding, search_embeddings)[0]
+
+    lexical_hits = np.flatnonzero(lexical)
+    lexical_hits = lexical_hits[np.argsort(-lexical[lexical_hits], kind="stable")][:HYBRID_CANDIDATES]
+    semantic_hits = np.argsort(-semantic, kind="stable")[:HYBRID_CANDIDATES]
+
+    fused = np.zeros(len(df))
+    for hits in (lexical_hits, semantic_hits):
+        fused[hits] += 1.0 / (HYBRID_RRF_K + np.arange(1, len(hits) + 1))
+
+    candidates = np.union1d(lexical_hits, semantic_hits)
+    candidates = candidates[np.argsort(-fused[candidates], kind="stable")][:top_k]
+
+    return pd.DataFrame({
+        "Job ID": df["Job ID"].values[candidates],
+        "Hybrid Score": np.round(fused[candidates] * 100, 3),
+        "Similarity %": np.round(semantic[candidates] * 100, 2),
+        "BM25 Score": np.round(lexical[candidates], 3)
+    })
+
+
+def search_jobs(query, top_k=20, mode="semantic"):
+    """
+    Dispatch a search query to the semantic, lexical or hybrid index
+    """
+    if mode == "lexical":
+        return search_by_keywords(query, top_k)
+    if mode == "hybrid":
+        return search_hybrid(query, top_k)
+    return search_by_natural_language(query, top_k)
+
+
+def evaluate_search_modes(top_k=10):
+    """
+    Latency and relevance per search mode, using each job title as a query
+    whose relevant result is that job itself (MRR and Recall@k)
+    """
+    queries = df["Job"].fillna("").astype(str).tolist() if "Job" in df.columns else []
+    job_ids = df["Job ID"].values
+
+    # Load the model up front so its load time is not counted as query latency
+    load_embedding_model()
+
+    rows = []
+    for mode in SEARCH_MODES:
+        latencies = []
+        reciprocal_ranks = []
+
+        for job_id, query in zip(job_ids, queries):
+            start = time.perf_counter()
+            results = search_jobs(query, top_k=top_k, mode=mode)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            hits = np.flatnonzero(results["Job ID"].values == job_id)
+            reciprocal_ranks.append(1.0 / (hits[0] + 1) if len(hits) else 0.0)
+
+        rows.append({
+            "Mode": mode,
+            "Mean Latency (ms)": round(float(np.mean(latencies)), 2) if latencies else 0.0,
+            "P95 Latency (ms)": round(float(np.percentile(latencies, 95)), 2) if latencies else 0.0,
+            "MRR": round(float(np.mean(reciprocal_ranks)), 3) if reciprocal_ranks else 0.0,
+            f"Recall@{top_k}": round(float(np.mean(np.array(reciprocal_ranks) > 0)), 3) if reciprocal_ranks else 0.0
+        })
+
+    return pd.DataFrame(rows)
+
+
 #Competency Similarity (FULL CROSS-MATCH FIXED)
 
-def competency_similarity(job_a_comps, job_b_comps):
-    if not job_a_comps or not job_b_comps:
-        return 0.0
+slot_mask = comp_slots >= 0
+slot_vectors = comp_vectors[np.maximum(comp_slots, 0)]
 
-    vecs_a = np.array([comp2vec[c] for c in job_a_comps])
-    vecs_b = np.array([comp2vec[c] for c in job_b_comps])
+def competency_similarity_tile(job_idx, vectors=slot_vectors):
+    """
+    Competency similarity between one job and every later job, in both
+    directions, from a single block product: for each competency of the
+    source job, the best match among the target job's competencies, averaged
+    """
+    others = slice(job_idx + 1, None)
+    other_vectors = vectors[others]
+    other_mask = slot_mask[others]
+
+    forward = np.zeros(len(other_vectors), dtype=vectors.dtype)
+    reverse = np.zeros(len(other_vectors), dtype=vectors.dtype)
+
+    own = vectors[job_idx, slot_mask[job_idx]]
+    if len(own) == 0 or len(other_vectors) == 0:
+        return forward, reverse
+
+    # (own slots, later jobs, slots) cosine block from the shared vector table
+    block = (own @ other_vectors.reshape(-1, other_vectors.shape[-1]).T).reshape(
+        len(own), *other_mask.shape
+    )
+    block = np.where(other_mask[None, :, :], block, -np.inf)
 
-    sim_matrix = cosine_similarity(vecs_a, vecs_b)
+    # Jobs without competencies score 0 in both directions
+    has_comps = other_mask.any(axis=1)
+    other_counts = np.maximum(other_mask.sum(axis=1), 1)
 
-    # Best match in Job B for each competency in Job A
-    best_matches = sim_matrix.max(axis=1)
+    forward[has_comps] = block.max(axis=2).mean(axis=0)[has_comps]
+    reverse[has_comps] = (
+        np.where(other_mask, block.max(axis=0), 0.0).sum(axis=1) / other_counts
+    )[has_comps]
 
-    return float(best_matches.mean())
+    return forward, reverse
 
 #Build Similarity Matrices
+# Pairs are stored upper-triangular (Job ID index < Compared Job ID index);
+# "Reverse" columns hold the Compared Job → Job direction
 
 n = len(df)
 
-# Text similarity
-text_sim_matrix = cosine_similarity(text_embeddings)
+pair_a, pair_b = np.triu_indices(n, k=1)
+
+# Text similarity (symmetric: one score per unordered pair)
+def text_similarity(dtype=COMPUTE_DTYPE):
+    if n < 2:
+        return np.zeros(0, dtype=dtype)
+    embeddings = text_embeddings.astype(dtype, copy=False)
+    return np.concatenate([
+        embeddings[i + 1:] @ embeddings[i] for i in range(n)
+    ]).astype(dtype)
+
+text_sim_pairs = run_stage(
+    "text_similarity",
+    inputs=["embeddings"],
+    params={"dtype": COMPUTE_DTYPE},
+    compute=text_similarity
+)
 
-# Competency similarity
-comp_sim_matrix = np.zeros((n, n))
+# Competency similarity (asymmetric: both directions per tile)
+def competency_similarity(dtype=COMPUTE_DTYPE):
+    vectors = slot_vectors.astype(dtype, copy=False)
+    comp_tiles = [competency_similarity_tile(i, vectors) for i in range(n)]
+    if not comp_tiles:
+        return np.zeros(0, dtype=dtype), np.zeros(0, dtype=dtype)
+    return (
+        np.concatenate([fwd for fwd, _ in comp_tiles]).astype(dtype),
+        np.concatenate([rev for _, rev in comp_tiles]).astype(dtype)
+    )
 
-for i in range(n):
-    for j in range(n):
-        comp_sim_matrix[i, j] = competency_similarity(
-            df.loc[i, "competency_list"],
-            df.loc[j, "competency_list"]
-        )
+comp_sim_pairs, comp_sim_pairs_rev = run_stage(
+    "competency_similarity",
+    inputs=["competency_vocabulary"],
+    params={"dtype": COMPUTE_DTYPE},
+    compute=competency_similarity
+)
         
 
 #Fusion Strategy (Configurable)
 TEXT_WEIGHT = 0.7
 COMP_WEIGHT = 0.3
 
-final_similarity = (
-    TEXT_WEIGHT * text_sim_matrix +
-    COMP_WEIGHT * comp_sim_matrix
+def fuse_scores(text_sim, comp_sim, comp_sim_rev):
+    """
+    Weighted text + competency similarity in both directions
+    """
+    return (
+        TEXT_WEIGHT * text_sim + COMP_WEIGHT * comp_sim,
+        TEXT_WEIGHT * text_sim + COMP_WEIGHT * comp_sim_rev
+    )
+
+def fuse():
+    forward, reverse = fuse_scores(text_sim_pairs, comp_sim_pairs, comp_sim_pairs_rev)
+    return forward.astype(COMPUTE_DTYPE), reverse.astype(COMPUTE_DTYPE)
+
+final_similarity_pairs, final_similarity_pairs_rev = run_stage(
+    "fusion",
+    inputs=["text_similarity", "competency_similarity"],
+    params={"text_weight": TEXT_WEIGHT, "comp_weight": COMP_WEIGHT},
+    compute=fuse
 )
 
-similarity_pct = np.round(final_similarity * 100, 2)
+def to_square(upper, lower, diagonal=0.0, dtype=COMPUTE_DTYPE):
+    """
+    Expand upper-triangular pair scores (and their reverse direction) to an n x n matrix
+    """
+    matrix = np.full((n, n), diagonal, dtype=dtype)
+    matrix[pair_a, pair_b] = upper
+    matrix[pair_b, pair_a] = lower
+    return matrix
+
+similarity_pct = np.round(to_square(final_similarity_pairs, final_similarity_pairs_rev) * 100, 2)
 
 #Explainability 
-def generate_similarity_reason(job_a_idx, job_b_idx):
+# Reason thresholds (text similarity high / moderate, competency similarity strong)
+TEXT_HIGH_THRESHOLD = 0.75
+TEXT_MODERATE_THRESHOLD = 0.5
+COMP_STRONG_THRESHOLD = 0.7
+
+def generate_similarity_reason(text_sim, shared_skills, comp_sim):
     reasons = []
 
-    if text_sim_matrix[job_a_idx, job_b_idx] > 0.75:
+    if text_sim > TEXT_HIGH_THRESHOLD:
         reasons.append("Highly similar responsibilities and outcomes")
 
-    elif text_sim_matrix[job_a_idx, job_b_idx] > 0.5:
+    elif text_sim > TEXT_MODERATE_THRESHOLD:
         reasons.append("Moderately similar responsibilities and deliverables")
 
-    shared_skills = set(df.loc[job_a_idx, "competency_list"]) & \
-                    set(df.loc[job_b_idx, "competency_list"])
-
     if shared_skills:
         reasons.append(f"Shared competencies: {', '.join(list(shared_skills)[:3])}")
 
-    if comp_sim_matrix[job_a_idx, job_b_idx] > 0.7:
+    if comp_sim > COMP_STRONG_THRESHOLD:
         reasons.append("Strong skill proficiency alignment")
 
     if not reasons:
@@ -187,56 +698,245 @@ def generate_similarity_reason(job_a_idx, job_b_idx):
 
     return "; ".join(reasons)
 
-#Final Output Table
-records = []
-
-for i in range(n):
-    for j in range(n):
-        if i == j:
-            continue
-
-        records.append({
-            "Job ID": df.loc[i, "Job ID"],
-            "Compared Job ID": df.loc[j, "Job ID"],
-            "Similarity %": similarity_pct[i, j],
-            "Text Similarity": round(text_sim_matrix[i, j], 3),
-            "Competency Similarity": round(comp_sim_matrix[i, j], 3),
-            "Similarity Reason": generate_similarity_reason(i, j)
-        })
+def explain():
+    # Shared skills are symmetric, so each unordered pair is intersected once
+    competency_sets = [set(comps) for comps in df["competency_list"]]
 
-results_df = pd.DataFrame(records)
+    pair_reasons = []
+    pair_reasons_rev = []
 
-# Standardize similarity formatting
-results_df["Similarity %"] = results_df["Similarity %"].astype(float).round(2)
-results_df["Text Similarity"] = (results_df["Text Similarity"] * 100).round(2)
-results_df["Competency Similarity"] = (results_df["Competency Similarity"] * 100).round(2)
+    for k, (i, j) in enumerate(zip(pair_a, pair_b)):
+        shared_skills = competency_sets[i] & competency_sets[j]
+        pair_reasons.append(generate_similarity_reason(text_sim_pairs[k], shared_skills, comp_sim_pairs[k]))
+        pair_reasons_rev.append(generate_similarity_reason(text_sim_pairs[k], shared_skills, comp_sim_pairs_rev[k]))
 
+    # Both reason columns share one category table so expanded rows stay categorical
+    reason_categories = pd.Categorical(pair_reasons + pair_reasons_rev).categories
 
-results_df.rename(columns={
-    "Text Similarity": "Text Similarity %",
-    "Competency Similarity": "Competency Similarity %"
-}, inplace=True)
+    return (
+        pd.Categorical(pair_reasons, categories=reason_categories),
+        pd.Categorical(pair_reasons_rev, categories=reason_categories)
+    )
 
+pair_reasons, pair_reasons_rev = run_stage(
+    "explanations",
+    inputs=["competency_vocabulary", "text_similarity", "competency_similarity"],
+    params={
+        "text_high": TEXT_HIGH_THRESHOLD,
+        "text_moderate": TEXT_MODERATE_THRESHOLD,
+        "comp_strong": COMP_STRONG_THRESHOLD
+    },
+    compute=explain
+)
 
-results_df.to_excel("job_similarity_output_v1.xlsx", index=False)
+#Score Storage & Pair Expansion
+SCORE_COLS = ["Similarity %", "Text Similarity %", "Competency Similarity %"]
 
-print("✅ Job similarity file exported successfully")
+def encode_scores(pct, precision=SCORE_PRECISION):
+    """
+    Convert percentage scores to the configured storage precision
+    """
+    if precision == "int16":
+        return np.round(np.clip(pct, -100, 100) * 100).astype(np.int16)
+    return np.asarray(pct, dtype=precision)
+
+def decode_scores(stored):
+    """
+    Convert stored scores back to float32 percentages
+    """
+    stored = np.asarray(stored)
+    if stored.dtype == np.int16:
+        return stored.astype(np.float32) / 100
+    return stored.astype(np.float32)
+
+REVERSE_COLS = {
+    "Job ID": "Compared Job ID",
+    "Compared Job ID": "Job ID",
+    "Reverse Similarity %": "Similarity %",
+    "Reverse Competency Similarity %": "Competency Similarity %",
+    "Reverse Similarity Reason": "Similarity Reason"
+}
+
+OUTPUT_COLS = ["Job ID", "Compared Job ID"] + SCORE_COLS + ["Similarity Reason"]
+
+def decode_pair_table(pairs):
+    """
+    Pair table with score columns decoded to float32 percentages
+    """
+    pairs = pairs.copy()
+    for col in SCORE_COLS + [c for c in REVERSE_COLS if c.endswith("%")]:
+        if col in pairs.columns:
+            pairs[col] = decode_scores(pairs[col].values)
+    return pairs
+
+def expand_pairs(pairs, forward=None, reverse=None):
+    """
+    Directional rows (Job ID → Compared Job ID) from the upper-triangular pair
+    table. forward / reverse are optional boolean masks selecting which pairs
+    to emit in each direction.
+    """
+    forward_rows = pairs if forward is None else pairs[forward]
+    reverse_rows = pairs if reverse is None else pairs[reverse]
+
+    reverse_rows = reverse_rows.drop(
+        columns=[c for c in REVERSE_COLS.values() if c not in REVERSE_COLS]
+    ).rename(columns=REVERSE_COLS)
+
+    return pd.concat(
+        [forward_rows[OUTPUT_COLS], reverse_rows[OUTPUT_COLS]],
+        ignore_index=True
+    )
+
+def take_directional_rows(pairs, pair_idx, reverse):
+    """
+    Directional rows for the given pair positions, in the given order;
+    reverse[k] selects the Compared Job → Job direction of pair_idx[k]
+    """
+    pair_idx = np.asarray(pair_idx)
+    reverse = np.asarray(reverse, dtype=bool)
+
+    rows = expand_pairs(pairs.iloc[pair_idx], forward=~reverse, reverse=reverse)
+
+    # expand_pairs emits all forward rows first; restore the requested order
+    emitted = np.concatenate([np.flatnonzero(~reverse), np.flatnonzero(reverse)])
+    return rows.iloc[np.argsort(emitted, kind="stable")].reset_index(drop=True)
+
+#Final Output Table
+def build_pair_table(precision=SCORE_PRECISION):
+    """
+    Compact upper-triangular pair table: categorical Job IDs and reasons,
+    scores at the given precision, both competency directions per row
+    """
+    pairs = pd.DataFrame({
+        "Job ID": pd.Categorical.from_codes(job_codes[pair_a], categories=job_id_table),
+        "Compared Job ID": pd.Categorical.from_codes(job_codes[pair_b], categories=job_id_table),
+        "Similarity %": encode_scores(np.round(final_similarity_pairs * 100, 2), precision),
+        "Reverse Similarity %": encode_scores(np.round(final_similarity_pairs_rev * 100, 2), precision),
+        "Text Similarity %": encode_scores(np.round(text_sim_pairs * 100, 1), precision),
+        "Competency Similarity %": encode_scores(np.round(comp_sim_pairs * 100, 1), precision),
+        "Reverse Competency Similarity %": encode_scores(np.round(comp_sim_pairs_rev * 100, 1), precision),
+        "Similarity Reason": pair_reasons,
+        "Reverse Similarity Reason": pair_reasons_rev
+    })
+    pairs.attrs["score_precision"] = precision
+    return pairs
 
 # job_ids must be aligned with embedding / competency matrices
 job_ids = df['Job ID'].values
 
-# final_similarity is already computed (0–1 scale)
-similarity_pct = np.round(final_similarity * 100, 2)
+def export():
+    results_df = build_pair_table()
+
+    # Compact typed copy for the app, decoded directional copy for the Excel deliverable
+    results_df.to_pickle("job_similarity_pairs.pkl")
+
+    export_df = expand_pairs(decode_pair_table(results_df))
+
+    # Restore the deliverable's row order: each job's comparisons together, both in dataset order
+    row_order = np.lexsort((np.concatenate([pair_b, pair_a]), np.concatenate([pair_a, pair_b])))
+    export_df = export_df.iloc[row_order].reset_index(drop=True)
+    export_df[SCORE_COLS] = export_df[SCORE_COLS].astype(float).round(2)
+    export_df.to_excel("job_similarity_output_v1.xlsx", index=False)
 
-# Create square similarity matrix
-similarity_matrix = pd.DataFrame(
-    similarity_pct,
-    index=job_ids,
-    columns=job_ids
+    print("✅ Job similarity file exported successfully")
+
+    # Square matrix at storage precision, with a perfect diagonal
+    stored_matrix = encode_scores(similarity_pct)
+    np.fill_diagonal(stored_matrix, encode_scores(100.0))
+
+    # The app's copy is ordered like job_id_table (the pair table's Job ID categories)
+    table_order = np.argsort(job_codes)
+    np.save("job_similarity_matrix.npy", stored_matrix[np.ix_(table_order, table_order)])
+
+    similarity_matrix = pd.DataFrame(
+        decode_scores(stored_matrix).astype(float).round(2),
+        index=job_ids,
+        columns=job_ids
+    )
+
+    # Export
+    similarity_matrix.to_excel("job_similarity_matrix.xlsx")
+
+    return results_df, similarity_matrix
+
+results_df, similarity_matrix = run_stage(
+    "export",
+    inputs=["ingest", "text_similarity", "competency_similarity", "fusion", "explanations"],
+    params={"precision": SCORE_PRECISION},
+    compute=export,
+    outputs=[
+        "job_similarity_pairs.pkl",
+        "job_similarity_output_v1.xlsx",
+        "job_similarity_matrix.npy",
+        "job_similarity_matrix.xlsx"
+    ]
 )
 
-# Optional: enforce perfect diagonal
-np.fill_diagonal(similarity_matrix.values, 100.0)
+# The export hash identifies the published data; the app keys its cache on it
+manifest["pipeline_hash"] = stage_hashes["export"]
+save_manifest(manifest)
+
+
+def float64_similarity_pct():
+    """
+    Fused similarity % recomputed end to end in float64, the original pipeline's precision
+    """
+    forward, reverse = fuse_scores(
+        text_similarity(np.float64), *competency_similarity(np.float64)
+    )
+    return np.round(to_square(forward, reverse, dtype=np.float64) * 100, 2)
+
+def object_pair_table():
+    """
+    Directional pair table in the original layout: string IDs and reasons, float64 scores
+    """
+    pairs = expand_pairs(decode_pair_table(build_pair_table("float32")))
+    pairs[["Job ID", "Compared Job ID", "Similarity Reason"]] = (
+        pairs[["Job ID", "Compared Job ID", "Similarity Reason"]].astype(str).astype(object)
+    )
+    pairs[SCORE_COLS] = pairs[SCORE_COLS].astype(np.float64)
+    return pairs
+
+def benchmark_precisions(top_k=10):
+    """
+    Memory, throughput and ranking stability of the pair table at each precision.
+    Rankings are compared against a float64 recomputation of the fused scores.
+    """
+    reference = float64_similarity_pct()
+
+    start = time.perf_counter()
+    reference_order = np.argsort(-reference, axis=1, kind="stable")[:, :top_k]
+    elapsed = time.perf_counter() - start
+
+    rows = [{
+        "Precision": "float64 (baseline)",
+        "Matrix MB": round(reference.nbytes / 1e6, 3),
+        "Pair Table MB": round(object_pair_table().memory_usage(deep=True).sum() / 1e6, 3),
+        "Top-k Rows/s": round(n / elapsed) if elapsed > 0 else None,
+        "Rows With Changed Top-k": 0
+    }]
+
+    for precision in SCORE_PRECISIONS:
+        stored = encode_scores(similarity_pct, precision)
+        pairs = build_pair_table(precision)
+
+        start = time.perf_counter()
+        order = np.argsort(-decode_scores(stored), axis=1, kind="stable")[:, :top_k]
+        elapsed = time.perf_counter() - start
+
+        rows.append({
+            "Precision": precision,
+            "Matrix MB": round(stored.nbytes / 1e6, 3),
+            "Pair Table MB": round(pairs.memory_usage(deep=True).sum() / 1e6, 3),
+            "Top-k Rows/s": round(n / elapsed) if elapsed > 0 else None,
+            "Rows With Changed Top-k": int((order != reference_order).any(axis=1).sum())
+        })
+
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    # Search benchmark (batch runs only, skipped when imported by the app)
+    print(evaluate_search_modes().to_string(index=False))
 
-# Export
-similarity_matrix.to_excel("job_similarity_matrix.xlsx")
+    # Precision benchmark
+    print(benchmark_precisions().to_string(index=False))